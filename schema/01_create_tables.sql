@@ -37,10 +37,15 @@
 --                       protocol upgrades) for event-driven analysis and
 --                       before/after comparison queries.
 --
+--   Bookkeeping Table:
+--     - populate_state: Payload hash of the last load per loader script,
+--                       used to skip reloading unchanged reference data.
+--
 -- GRAIN: daily_prices and daily_metrics share the same grain --
 --        one row per (asset_id, date) combination, enforced by UNIQUE
 --        constraints. Both tables reference the assets and date_dim
---        dimensions via foreign keys.
+--        dimensions via foreign keys. daily_prices is LIST-partitioned
+--        by asset_id (one partition per asset).
 --
 -- NUMERIC PRECISION: All price columns use NUMERIC(20,8) to preserve
 --        sub-cent precision for low-priced assets. Volume and market cap
@@ -103,9 +108,20 @@ CREATE TABLE IF NOT EXISTS date_dim (
 -- CHECK constraints ensure data integrity:
 --   - close > 0   : A zero or negative closing price is invalid
 --   - volume >= 0  : Volume can be zero (e.g., delisted/halted) but not negative
+--
+-- PARTITIONING: The table is LIST-partitioned on asset_id, one partition
+-- per asset (daily_prices_<symbol>). Every window function in the metrics
+-- pipeline and most analytical queries partition or filter by asset_id, so
+-- each asset's history lives in its own heap and per-asset scans prune to
+-- a single partition. Partitions are created by scripts/ingest_yahoo.py
+-- when the asset is registered; the DEFAULT partition only catches rows
+-- for assets that were loaded some other way.
+--
+-- A primary key on a partitioned table must include the partition key,
+-- hence PRIMARY KEY (price_id, asset_id) rather than price_id alone.
 
 CREATE TABLE IF NOT EXISTS daily_prices (
-    price_id        SERIAL          PRIMARY KEY,
+    price_id        SERIAL          NOT NULL,
     asset_id        INT             NOT NULL
                                     REFERENCES assets(asset_id),
     date            DATE            NOT NULL
@@ -117,10 +133,14 @@ CREATE TABLE IF NOT EXISTS daily_prices (
     volume_usd      NUMERIC(30,2),
     market_cap_usd  NUMERIC(30,2),
 
+    CONSTRAINT pk_daily_prices              PRIMARY KEY (price_id, asset_id),
     CONSTRAINT uq_daily_prices_asset_date   UNIQUE (asset_id, date),
     CONSTRAINT chk_daily_prices_close       CHECK (close > 0),
     CONSTRAINT chk_daily_prices_volume      CHECK (volume_usd >= 0)
-);
+) PARTITION BY LIST (asset_id);
+
+CREATE TABLE IF NOT EXISTS daily_prices_default
+    PARTITION OF daily_prices DEFAULT;
 
 
 -- ---------------------------------------------------------------------------
@@ -179,6 +199,8 @@ CREATE TABLE IF NOT EXISTS market_events (
     affected_assets VARCHAR(500),
     source_url      TEXT,
 
+    -- Natural key: scripts/populate_events.py upserts on it.
+    CONSTRAINT uq_market_events_date_title UNIQUE (event_date, title),
     CONSTRAINT chk_event_type CHECK (
         event_type IN (
             'halving',
@@ -191,3 +213,18 @@ CREATE TABLE IF NOT EXISTS market_events (
         )
     )
 );
+
+
+-- ---------------------------------------------------------------------------
+-- 6. POPULATE_STATE -- Loader Bookkeeping
+-- ---------------------------------------------------------------------------
+-- One row per loader script recording a hash of the payload it last
+-- loaded. scripts/populate_events.py compares the hash of its static
+-- event list against this row and skips the load when nothing changed
+-- (run it with --force to re-synchronise anyway).
+
+CREATE TABLE IF NOT EXISTS populate_state (
+    script          VARCHAR(50)     PRIMARY KEY,
+    payload_hash    CHAR(64)        NOT NULL,
+    loaded_at       TIMESTAMPTZ     NOT NULL DEFAULT now()
+);
@@ -37,6 +37,10 @@
 --    This directly serves:
 --      - Phase 4 event queries (price behavior N days before/after events)
 --
+-- NOTE: The daily_prices composite index additionally INCLUDEs the OHLCV
+-- columns (a covering index) so the metrics pipeline can scan it
+-- index-only; see Index 1 below.
+--
 -- NOTE: The UNIQUE constraints on (asset_id, date) in daily_prices and
 -- daily_metrics already create implicit unique indexes. The explicit
 -- composite indexes below may be redundant with those unique indexes in
@@ -48,14 +52,27 @@
 
 
 -- ---------------------------------------------------------------------------
--- Index 1: Composite index on daily_prices for single-asset time-series
+-- Index 1: Covering composite index on daily_prices for single-asset time-series
 -- ---------------------------------------------------------------------------
 -- Supports the most common query pattern: retrieve price data for one asset
 -- over a date range. Used by momentum (Q1), volatility (Q2), drawdown (Q4),
 -- and volume anomaly (Q5) queries.
+--
+-- INCLUDE carries the OHLCV payload in the leaf pages, so the metrics
+-- pipeline (scripts/compute_metrics.py) can read daily_prices with an
+-- index-only scan that already returns rows in (asset_id, date) order --
+-- the order every PARTITION BY asset_id ORDER BY date window needs -- and
+-- the planner drops the Sort in front of WindowAgg. Index-only scans rely
+-- on the visibility map, so VACUUM (or autovacuum) daily_prices after a
+-- large load.
+--
+-- scripts/ingest_yahoo.py also CLUSTERs every daily_prices partition on
+-- this index after each load, so heap fetches (when the visibility map is
+-- stale) stay sequential in (asset_id, date) order.
 
 CREATE INDEX IF NOT EXISTS idx_daily_prices_asset_date
-    ON daily_prices (asset_id, date);
+    ON daily_prices (asset_id, date)
+    INCLUDE (open, high, low, close, volume_usd);
 
 
 -- ---------------------------------------------------------------------------
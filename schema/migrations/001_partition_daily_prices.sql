@@ -0,0 +1,103 @@
+-- ============================================================================
+-- Crypto Market Analytics Data Warehouse -- Migration
+-- File: migrations/001_partition_daily_prices.sql
+-- Database: PostgreSQL
+-- ============================================================================
+--
+-- Converts an existing, unpartitioned daily_prices table to the
+-- LIST-partitioned layout defined in 01_create_tables.sql.
+--
+-- 01_create_tables.sql uses CREATE TABLE IF NOT EXISTS, so on a database
+-- created before partitioning it leaves the old heap in place and
+-- scripts/ingest_yahoo.py refuses to run (PARTITION OF needs a partitioned
+-- parent). Run this once, then re-run 02_create_indexes.sql:
+--
+--   psql -d crypto_analytics -f schema/migrations/001_partition_daily_prices.sql
+--   psql -d crypto_analytics -f schema/02_create_indexes.sql
+--
+-- The whole migration runs in one transaction: the old table is renamed,
+-- the partitioned table and one partition per registered asset are
+-- created, rows are copied across with their price_id preserved, the
+-- price_id sequence is handed over, and the old table is dropped.
+-- Re-running on an already partitioned table is a no-op.
+--
+-- ============================================================================
+
+BEGIN;
+
+DO $$
+DECLARE
+    a RECORD;
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM pg_partitioned_table
+        WHERE partrelid = to_regclass('daily_prices')
+    ) THEN
+        RAISE NOTICE 'daily_prices is already partitioned; nothing to do.';
+        RETURN;
+    END IF;
+
+    -- Move the old table and its index names out of the way; index and
+    -- constraint-backed index names share the schema namespace.
+    ALTER TABLE daily_prices RENAME TO daily_prices_old;
+    ALTER TABLE daily_prices_old
+        RENAME CONSTRAINT uq_daily_prices_asset_date
+        TO uq_daily_prices_old_asset_date;
+    ALTER INDEX IF EXISTS idx_daily_prices_asset_date
+        RENAME TO idx_daily_prices_old_asset_date;
+    ALTER INDEX IF EXISTS idx_daily_prices_date
+        RENAME TO idx_daily_prices_old_date;
+
+    -- Same definition as 01_create_tables.sql, except price_id keeps
+    -- drawing from the existing sequence so ids stay stable.
+    CREATE TABLE daily_prices (
+        price_id        INT             NOT NULL
+                                        DEFAULT nextval('daily_prices_price_id_seq'),
+        asset_id        INT             NOT NULL
+                                        REFERENCES assets(asset_id),
+        date            DATE            NOT NULL
+                                        REFERENCES date_dim(date_id),
+        open            NUMERIC(20,8),
+        high            NUMERIC(20,8),
+        low             NUMERIC(20,8),
+        close           NUMERIC(20,8)   NOT NULL,
+        volume_usd      NUMERIC(30,2),
+        market_cap_usd  NUMERIC(30,2),
+
+        CONSTRAINT pk_daily_prices              PRIMARY KEY (price_id, asset_id),
+        CONSTRAINT uq_daily_prices_asset_date   UNIQUE (asset_id, date),
+        CONSTRAINT chk_daily_prices_close       CHECK (close > 0),
+        CONSTRAINT chk_daily_prices_volume      CHECK (volume_usd >= 0)
+    ) PARTITION BY LIST (asset_id);
+
+    ALTER SEQUENCE daily_prices_price_id_seq OWNED BY daily_prices.price_id;
+
+    CREATE TABLE daily_prices_default
+        PARTITION OF daily_prices DEFAULT;
+
+    -- Same naming as create_price_partitions() in scripts/ingest_yahoo.py.
+    FOR a IN SELECT asset_id, symbol FROM assets ORDER BY asset_id LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF daily_prices FOR VALUES IN (%s)',
+            'daily_prices_' || lower(a.symbol),
+            a.asset_id
+        );
+    END LOOP;
+
+    INSERT INTO daily_prices (
+        price_id, asset_id, date, open, high, low, close,
+        volume_usd, market_cap_usd
+    )
+    SELECT
+        price_id, asset_id, date, open, high, low, close,
+        volume_usd, market_cap_usd
+    FROM daily_prices_old;
+
+    DROP TABLE daily_prices_old;
+
+    RAISE NOTICE 'daily_prices converted to a LIST-partitioned table.';
+END
+$$;
+
+COMMIT;
@@ -0,0 +1,48 @@
+-- ============================================================================
+-- Crypto Market Analytics Data Warehouse -- Migration
+-- File: migrations/002_market_events_natural_key.sql
+-- Database: PostgreSQL
+-- ============================================================================
+--
+-- Adds the (event_date, title) natural key to an existing market_events
+-- table. 01_create_tables.sql declares uq_market_events_date_title inside
+-- CREATE TABLE IF NOT EXISTS, so a database created before the constraint
+-- existed never gets it, and the ON CONFLICT (event_date, title) upsert in
+-- scripts/populate_events.py fails. Run this once:
+--
+--   psql -d crypto_analytics -f schema/migrations/002_market_events_natural_key.sql
+--
+-- Any duplicate (event_date, title) rows are collapsed to the one with the
+-- lowest event_id first, so the constraint can be added. Re-running once
+-- the constraint exists is a no-op.
+--
+-- ============================================================================
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM pg_constraint
+        WHERE conrelid = 'market_events'::regclass
+          AND conname = 'uq_market_events_date_title'
+    ) THEN
+        RAISE NOTICE 'uq_market_events_date_title already exists; nothing to do.';
+        RETURN;
+    END IF;
+
+    DELETE FROM market_events me
+    USING market_events keep
+    WHERE keep.event_date = me.event_date
+      AND keep.title = me.title
+      AND keep.event_id < me.event_id;
+
+    ALTER TABLE market_events
+        ADD CONSTRAINT uq_market_events_date_title UNIQUE (event_date, title);
+
+    RAISE NOTICE 'uq_market_events_date_title added.';
+END
+$$;
+
+COMMIT;
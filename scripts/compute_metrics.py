@@ -3,11 +3,18 @@ Compute Daily Metrics for Crypto Market Analytics Data Warehouse.
 
 Purpose:
     Populates the daily_metrics table by computing all 7 technical indicators
-    from the raw daily_prices data using a single SQL CTE chain executed via
-    PostgreSQL window functions.  The SQL engine handles all rolling
+    from the raw daily_prices data using a single INSERT ... SELECT executed
+    via PostgreSQL window functions.  The SQL engine handles all rolling
     computations (STDDEV_POP, AVG, LAG) efficiently over ~10,000+ rows per
     asset, avoiding Python-side loops.
 
+    The statement has a single inner level for the per-row return (window
+    functions cannot be nested), declared ``NOT MATERIALIZED`` (PostgreSQL
+    12+) so the planner inlines it instead of spooling it into a tuplestore.
+
+    By default each run only refreshes the trailing 35 days per asset
+    (upsert); ``--full-recompute`` rebuilds the whole table.
+
     Metrics computed:
         1. daily_return_pct  -- close-to-close simple return (percentage)
         2. daily_range_pct   -- intraday (high-low)/low (percentage)
@@ -21,52 +28,63 @@ Usage:
     # Configure via .env file or environment variables:
     #   DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
 
-    python compute_metrics.py
+    python compute_metrics.py                   # refresh the last 35 days per asset
+    python compute_metrics.py --full-recompute  # rebuild from full history
 
 Dependencies:
-    psycopg2-binary  -- PostgreSQL adapter
+    psycopg[binary]  -- PostgreSQL adapter (psycopg 3; pipeline mode needs libpq 14+)
     python-dotenv    -- Environment variable loading from .env files
 """
 
+import argparse
 import logging
 import os
 import sys
 import time
-from typing import Optional
+from typing import Any, Optional
 
-import psycopg2
-import psycopg2.extensions
-from dotenv import load_dotenv
+import psycopg
 
 # ---------------------------------------------------------------------------
 # Logging Configuration
 # ---------------------------------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
+# Handlers are installed by _configure_logging() from main(), not at import.
 logger = logging.getLogger("compute_metrics")
 
 
+def _configure_logging() -> None:
+    """Install the stdout handler and INFO level on the root logger."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+
+
 # ---------------------------------------------------------------------------
 # Database Connection
 # ---------------------------------------------------------------------------
-def get_db_connection() -> psycopg2.extensions.connection:
+def get_db_connection() -> psycopg.Connection:
     """Create and return a PostgreSQL connection using environment variables.
 
     Expected env vars: DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD.
-    Raises ``psycopg2.OperationalError`` if the connection cannot be established.
+    Raises ``psycopg.OperationalError`` if the connection cannot be established.
+
+    Server tuning note: the metrics INSERT normally reads daily_prices in
+    (asset_id, date) order from the covering idx_daily_prices_asset_date
+    index, so no sort is needed.  If the planner does fall back to a Sort
+    (e.g. stale visibility map), keep it in memory by giving the role at
+    least ``work_mem >= rows_per_asset * row_width * 2 / n_workers``.
     """
-    conn = psycopg2.connect(
+    conn = psycopg.connect(
         host=os.environ["DB_HOST"],
         port=int(os.environ.get("DB_PORT", "5432")),
         dbname=os.environ["DB_NAME"],
         user=os.environ["DB_USER"],
         password=os.environ["DB_PASSWORD"],
+        autocommit=False,
     )
-    conn.autocommit = False
     logger.info(
         "Connected to PostgreSQL: %s@%s:%s/%s",
         os.environ["DB_USER"],
@@ -78,154 +96,129 @@ def get_db_connection() -> psycopg2.extensions.connection:
 
 
 # ---------------------------------------------------------------------------
-# SQL CTE Chain -- All 7 Metrics in a Single Statement
+# Metrics SQL -- All 7 Metrics in a Single Statement
 # ---------------------------------------------------------------------------
-METRICS_SQL: str = """
-WITH base_data AS (
-    -- CTE 1: Join daily_prices with assets to get all needed columns.
-    -- This is the foundation for all metric calculations.
+# One SELECT reading daily_prices directly.  A single inner level
+# (with_returns) is unavoidable: vol_7d/vol_30d take STDDEV_POP over
+# daily_return_pct, which is itself a LAG window, and window functions cannot
+# be nested.
+#
+# The SELECT is a template shared by the two INSERT statements below:
+# {refresh_join} / {refresh_filter} are empty for a full recompute and limit
+# the input rows to the refresh window (plus lookback) for an incremental run.
+_METRICS_SELECT_TEMPLATE: str = """
+WITH with_returns AS NOT MATERIALIZED (
+    -- Inner level: per-row values derived from daily_prices.
+    -- daily_return_pct uses LAG to get the previous close for the same asset.
+    -- daily_range_pct uses (high - low) / low -- always non-negative.
+    -- rn is the 0-based row position within the asset, used by the outer
+    -- level to tell whether a rolling frame is full.
+    -- NOT MATERIALIZED (PostgreSQL 12+) keeps this inlined into one plan;
+    -- no ORDER BY here, the windows sort by (asset_id, date) themselves.
     SELECT
         dp.asset_id,
         dp.date,
-        dp.open,
-        dp.high,
-        dp.low,
         dp.close,
-        dp.volume_usd
-    FROM daily_prices dp
-    JOIN assets a ON a.asset_id = dp.asset_id
-    WHERE a.is_active = TRUE
-    ORDER BY dp.asset_id, dp.date
-),
-
-with_returns AS (
-    -- CTE 2: Compute daily_return_pct and daily_range_pct.
-    -- daily_return_pct uses LAG to get the previous close for the same asset.
-    -- daily_range_pct uses (high - low) / low -- always non-negative.
-    SELECT
-        bd.asset_id,
-        bd.date,
-        bd.close,
-        bd.volume_usd,
+        dp.volume_usd,
+        ROW_NUMBER() OVER w - 1 AS rn,
 
         -- Metric 1: daily_return_pct (percentage, e.g. 5.0 for +5%)
-        -- NULL on the first day per asset (no previous close).
-        CASE
-            WHEN LAG(bd.close, 1) OVER (
-                PARTITION BY bd.asset_id ORDER BY bd.date
-            ) IS NOT NULL
-            THEN (
-                (bd.close - LAG(bd.close, 1) OVER (
-                    PARTITION BY bd.asset_id ORDER BY bd.date
-                ))
-                / LAG(bd.close, 1) OVER (
-                    PARTITION BY bd.asset_id ORDER BY bd.date
-                )
-                * 100
-            )
-            ELSE NULL
-        END AS daily_return_pct,
+        -- NULL on the first day per asset (LAG returns NULL, so the whole
+        -- expression is NULL). NULLIF guards against a zero previous close.
+        (dp.close / NULLIF(LAG(dp.close, 1) OVER w, 0) - 1) * 100
+            AS daily_return_pct,
 
         -- Metric 2: daily_range_pct (percentage)
         -- NULL only if high or low is NULL.
         CASE
-            WHEN bd.high IS NOT NULL AND bd.low IS NOT NULL
-            THEN (bd.high - bd.low) / bd.low * 100
+            WHEN dp.high IS NOT NULL AND dp.low IS NOT NULL
+            THEN (dp.high - dp.low) / dp.low * 100
             ELSE NULL
         END AS daily_range_pct
 
-    FROM base_data bd
-),
-
-with_all_metrics AS (
-    -- CTE 3: Compute vol_7d, vol_30d, sma_7, sma_30, volume_ratio_30d.
-    -- All use window functions over with_returns.
-    -- Each metric enforces minimum observations via CASE + COUNT.
-    SELECT
-        wr.asset_id,
-        wr.date,
-        wr.daily_return_pct,
-        wr.daily_range_pct,
-
-        -- Metric 3: vol_7d -- 7-day rolling realized volatility (STDDEV_POP)
-        -- Requires exactly 7 non-NULL return values in the window.
-        CASE
-            WHEN COUNT(wr.daily_return_pct) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
-            ) = 7
-            THEN STDDEV_POP(wr.daily_return_pct) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
-            )
-            ELSE NULL
-        END AS vol_7d,
-
-        -- Metric 4: vol_30d -- 30-day rolling realized volatility (STDDEV_POP)
-        -- Requires exactly 30 non-NULL return values in the window.
-        CASE
-            WHEN COUNT(wr.daily_return_pct) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 29 PRECEDING AND CURRENT ROW
-            ) = 30
-            THEN STDDEV_POP(wr.daily_return_pct) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 29 PRECEDING AND CURRENT ROW
-            )
-            ELSE NULL
-        END AS vol_30d,
-
-        -- Metric 5: sma_7 -- 7-day simple moving average of close price
-        -- Requires exactly 7 non-NULL close prices in the window.
-        CASE
-            WHEN COUNT(wr.close) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
-            ) = 7
-            THEN AVG(wr.close) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
-            )
-            ELSE NULL
-        END AS sma_7,
-
-        -- Metric 6: sma_30 -- 30-day simple moving average of close price
-        -- Requires exactly 30 non-NULL close prices in the window.
-        CASE
-            WHEN COUNT(wr.close) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 29 PRECEDING AND CURRENT ROW
-            ) = 30
-            THEN AVG(wr.close) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 29 PRECEDING AND CURRENT ROW
-            )
-            ELSE NULL
-        END AS sma_30,
-
-        -- Metric 7: volume_ratio_30d -- today's volume / avg of prior 30 days
-        -- Window EXCLUDES current day (ROWS BETWEEN 30 PRECEDING AND 1 PRECEDING).
-        -- Requires exactly 30 non-NULL prior volume observations.
-        -- NULLIF prevents division by zero if the average is somehow zero.
-        CASE
-            WHEN COUNT(wr.volume_usd) OVER (
-                PARTITION BY wr.asset_id ORDER BY wr.date
-                ROWS BETWEEN 30 PRECEDING AND 1 PRECEDING
-            ) = 30
-            THEN wr.volume_usd / NULLIF(
-                AVG(wr.volume_usd) OVER (
-                    PARTITION BY wr.asset_id ORDER BY wr.date
-                    ROWS BETWEEN 30 PRECEDING AND 1 PRECEDING
-                ), 0
-            )
-            ELSE NULL
-        END AS volume_ratio_30d
-
-    FROM with_returns wr
+    FROM daily_prices dp
+    JOIN assets a ON a.asset_id = dp.asset_id{refresh_join}
+    WHERE a.is_active = TRUE{refresh_filter}
+    WINDOW w AS (PARTITION BY dp.asset_id ORDER BY dp.date)
 )
 
--- Final INSERT: write all computed metrics into daily_metrics.
-INSERT INTO daily_metrics (
+-- Outer level: rolling metrics.
+--
+-- The close- and return-based metrics enforce minimum observations by
+-- gating on rn: an asset's rows are contiguous and date-ordered, so a frame
+-- of k rows is full from rn = k - 1 on. Return-based frames need one extra
+-- row because the first daily_return_pct per asset is NULL. This is exact
+-- only because close is NOT NULL; volume_usd is nullable, so
+-- volume_ratio_30d counts its non-NULL inputs instead.
+--
+-- Frame evaluation is already incremental: for NUMERIC inputs, STDDEV_POP
+-- and AVG have inverse transition functions (numeric_accum_inv etc.), so
+-- WindowAgg runs them in moving-aggregate mode -- one add + one remove per
+-- row, O(N) overall. The float8 variants have NO inverse transition (it
+-- would be inexact), so casting these inputs to double precision would fall
+-- back to re-aggregating the whole frame for every row (O(N*W)).
+SELECT
+    wr.asset_id,
+    wr.date,
+    wr.daily_return_pct,
+    wr.daily_range_pct,
+
+    -- Metric 3: vol_7d -- 7-day rolling realized volatility (STDDEV_POP)
+    -- Requires 7 non-NULL returns, i.e. rows 1..7 at the earliest.
+    CASE
+        WHEN wr.rn >= 7
+        THEN STDDEV_POP(wr.daily_return_pct) OVER w7
+        ELSE NULL
+    END AS vol_7d,
+
+    -- Metric 4: vol_30d -- 30-day rolling realized volatility (STDDEV_POP)
+    -- Requires 30 non-NULL returns, i.e. rows 1..30 at the earliest.
+    CASE
+        WHEN wr.rn >= 30
+        THEN STDDEV_POP(wr.daily_return_pct) OVER w30
+        ELSE NULL
+    END AS vol_30d,
+
+    -- Metric 5: sma_7 -- 7-day simple moving average of close price
+    -- Requires 7 close prices in the window.
+    CASE
+        WHEN wr.rn >= 6
+        THEN AVG(wr.close) OVER w7
+        ELSE NULL
+    END AS sma_7,
+
+    -- Metric 6: sma_30 -- 30-day simple moving average of close price
+    -- Requires 30 close prices in the window.
+    CASE
+        WHEN wr.rn >= 29
+        THEN AVG(wr.close) OVER w30
+        ELSE NULL
+    END AS sma_30,
+
+    -- Metric 7: volume_ratio_30d -- today's volume / avg of prior 30 days
+    -- Window EXCLUDES current day (w30p: 30 PRECEDING AND 1 PRECEDING).
+    -- Requires 30 non-NULL prior volumes (COUNT over the same w30p frame,
+    -- so it is evaluated by the same WindowAgg node as the AVG).
+    -- NULLIF prevents division by zero if the average is somehow zero.
+    CASE
+        WHEN COUNT(wr.volume_usd) OVER w30p = 30
+        THEN wr.volume_usd / NULLIF(AVG(wr.volume_usd) OVER w30p, 0)
+        ELSE NULL
+    END AS volume_ratio_30d
+
+FROM with_returns wr
+-- Named windows: one definition per distinct frame, so every aggregate
+-- sharing a frame is evaluated by the same WindowAgg node.
+WINDOW
+    w7   AS (PARTITION BY wr.asset_id ORDER BY wr.date
+             ROWS BETWEEN 6 PRECEDING AND CURRENT ROW),
+    w30  AS (PARTITION BY wr.asset_id ORDER BY wr.date
+             ROWS BETWEEN 29 PRECEDING AND CURRENT ROW),
+    w30p AS (PARTITION BY wr.asset_id ORDER BY wr.date
+             ROWS BETWEEN 30 PRECEDING AND 1 PRECEDING)
+"""
+
+_METRICS_COLUMNS: str = """(
     asset_id,
     date,
     daily_return_pct,
@@ -235,65 +228,180 @@ INSERT INTO daily_metrics (
     sma_7,
     sma_30,
     volume_ratio_30d
+)"""
+
+# Full recompute: every row, written into the daily_metrics_new staging table
+# (see STAGE_STATEMENTS / SWAP_STATEMENTS below).
+FULL_METRICS_SQL: str = (
+    "\nINSERT INTO daily_metrics_new " + _METRICS_COLUMNS + "\n"
+    + _METRICS_SELECT_TEMPLATE.format(refresh_join="", refresh_filter="")
+    + "ORDER BY wr.asset_id, wr.date;\n"
 )
+
+# ---------------------------------------------------------------------------
+# Incremental Refresh
+# ---------------------------------------------------------------------------
+# daily_prices is append-only in practice, so only the tail of each asset's
+# history changes between runs.  The incremental statement re-upserts every
+# row dated after ``MAX(daily_metrics.date) - REFRESH_DAYS`` for that asset
+# (all rows for an asset that has no metrics yet) and leaves older rows
+# untouched.
+#
+# The rolling windows of the first refreshed rows reach up to 30 rows back,
+# and the rn gating needs each refreshed row's true position, so the input
+# additionally starts LOOKBACK_ROWS price rows before the refresh window
+# (30-row frame + the row feeding the first LAG return).  The lookback is
+# counted in rows, not days -- found per asset with a backward index scan
+# (ORDER BY date DESC OFFSET LOOKBACK_ROWS - 1 LIMIT 1) -- so date gaps in
+# daily_prices cannot shorten it and the refreshed rows get exactly the
+# values a full recompute would.  Those lookback rows only feed the windows
+# and are not written.  Revisions to prices older than the refresh window
+# need --full-recompute.
+REFRESH_DAYS: int = 35
+LOOKBACK_ROWS: int = 31
+
+INCREMENTAL_METRICS_SQL: str = (
+    """
+WITH cutoff AS (
+    -- Per-asset refresh cutoff; NULL when the asset has no metrics yet.
+    SELECT
+        a.asset_id,
+        MAX(dm.date) - """ + str(REFRESH_DAYS) + """ AS refresh_after
+    FROM assets a
+    LEFT JOIN daily_metrics dm ON dm.asset_id = a.asset_id
+    WHERE a.is_active = TRUE
+    GROUP BY a.asset_id
+),
+
+refresh AS (
+    -- lookback_from: date of the LOOKBACK_ROWS-th price row at or before the
+    -- cutoff.  NULL (read the whole history) when there is no cutoff or the
+    -- asset has fewer rows than that.
+    SELECT
+        c.asset_id,
+        c.refresh_after,
+        lb.date AS lookback_from
+    FROM cutoff c
+    LEFT JOIN LATERAL (
+        SELECT dp.date
+        FROM daily_prices dp
+        WHERE dp.asset_id = c.asset_id
+          AND dp.date <= c.refresh_after
+        ORDER BY dp.date DESC
+        OFFSET """ + str(LOOKBACK_ROWS - 1) + """ LIMIT 1
+    ) lb ON TRUE
+),
+
+metrics AS (
+"""
+    + _METRICS_SELECT_TEMPLATE.format(
+        refresh_join="\n    JOIN refresh r ON r.asset_id = dp.asset_id",
+        refresh_filter=(
+            "\n      AND (r.lookback_from IS NULL"
+            "\n           OR dp.date >= r.lookback_from)"
+        ),
+    )
+    + """)
+
+-- Upsert only the refresh window; lookback rows are discarded here.
+INSERT INTO daily_metrics """ + _METRICS_COLUMNS + """
 SELECT
-    asset_id,
-    date,
-    daily_return_pct,
-    daily_range_pct,
-    vol_7d,
-    vol_30d,
-    sma_7,
-    sma_30,
-    volume_ratio_30d
-FROM with_all_metrics
-ORDER BY asset_id, date;
+    m.asset_id,
+    m.date,
+    m.daily_return_pct,
+    m.daily_range_pct,
+    m.vol_7d,
+    m.vol_30d,
+    m.sma_7,
+    m.sma_30,
+    m.volume_ratio_30d
+FROM metrics m
+JOIN refresh r ON r.asset_id = m.asset_id
+WHERE r.refresh_after IS NULL
+   OR m.date > r.refresh_after
+ORDER BY m.asset_id, m.date
+ON CONFLICT (asset_id, date) DO UPDATE
+    SET daily_return_pct = EXCLUDED.daily_return_pct,
+        daily_range_pct  = EXCLUDED.daily_range_pct,
+        vol_7d           = EXCLUDED.vol_7d,
+        vol_30d          = EXCLUDED.vol_30d,
+        sma_7            = EXCLUDED.sma_7,
+        sma_30           = EXCLUDED.sma_30,
+        volume_ratio_30d = EXCLUDED.volume_ratio_30d;
 """
+)
 
 
 # ---------------------------------------------------------------------------
-# Metrics Computation
+# UNLOGGED Staging Table + Swap
 # ---------------------------------------------------------------------------
-def compute_metrics(conn: psycopg2.extensions.connection) -> int:
-    """Delete existing metrics and recompute all 7 metrics via SQL CTE chain.
+# The full recompute is loaded into an UNLOGGED clone of daily_metrics so the
+# bulk INSERT skips per-row WAL.  Indexes are built once after the load rather
+# than being maintained row by row, then the clone replaces daily_metrics.
+#
+# LIKE ... INCLUDING DEFAULTS carries over the metric_id nextval() default but
+# not the PK, UNIQUE or FOREIGN KEY constraints; those are re-created here
+# with the same names as schema/01_create_tables.sql and
+# schema/02_create_indexes.sql -- keep the three in sync.  The PK and UNIQUE
+# indexes are built under temporary names and attached with
+# ``ADD CONSTRAINT ... USING INDEX`` after the old table is gone, so the
+# ACCESS EXCLUSIVE lock on daily_metrics is only held for the rename.
+#
+# Kept as one statement per element: pipeline mode (see compute_metrics) uses
+# the extended query protocol, which accepts a single statement per execute.
+STAGE_STATEMENTS: tuple[str, ...] = (
+    "DROP TABLE IF EXISTS daily_metrics_new;",
+    "CREATE UNLOGGED TABLE daily_metrics_new (LIKE daily_metrics INCLUDING DEFAULTS);",
+)
 
-    Uses DELETE + INSERT inside a single transaction for idempotency.
-    Returns the number of rows inserted into daily_metrics.
-    """
-    with conn.cursor() as cur:
-        # Step 1: Clear existing metrics (idempotency).
-        logger.info("Deleting existing rows from daily_metrics...")
-        cur.execute("DELETE FROM daily_metrics;")
-        deleted: int = cur.rowcount
-        logger.info("Deleted %d existing rows from daily_metrics.", deleted)
-
-        # Step 2: Execute the CTE chain to compute and insert all metrics.
-        logger.info("Computing all 7 metrics via SQL CTE chain...")
-        cur.execute(METRICS_SQL)
-        inserted: int = cur.rowcount
-        logger.info("Inserted %d rows into daily_metrics.", inserted)
-
-    # Commit the transaction (DELETE + INSERT are atomic).
-    conn.commit()
-    return inserted
+SWAP_STATEMENTS: tuple[str, ...] = (
+    # Make the loaded table crash-safe before it becomes daily_metrics.
+    "ALTER TABLE daily_metrics_new SET LOGGED;",
+
+    # Build indexes once, after the load.
+    """CREATE UNIQUE INDEX daily_metrics_new_pkey
+        ON daily_metrics_new (metric_id);""",
+    """CREATE UNIQUE INDEX daily_metrics_new_asset_date_key
+        ON daily_metrics_new (asset_id, date);""",
+    """CREATE INDEX daily_metrics_new_asset_date_idx
+        ON daily_metrics_new (asset_id, date);""",
+
+    # FK constraint names are per-table, so they can take their final names now.
+    """ALTER TABLE daily_metrics_new
+        ADD CONSTRAINT daily_metrics_asset_id_fkey
+            FOREIGN KEY (asset_id) REFERENCES assets(asset_id),
+        ADD CONSTRAINT daily_metrics_date_fkey
+            FOREIGN KEY (date) REFERENCES date_dim(date_id);""",
+
+    # The SERIAL sequence is owned by the old table; hand it over before DROP.
+    "ALTER SEQUENCE daily_metrics_metric_id_seq OWNED BY daily_metrics_new.metric_id;",
+
+    # Swap.
+    "DROP TABLE daily_metrics;",
+    "ALTER TABLE daily_metrics_new RENAME TO daily_metrics;",
+    """ALTER TABLE daily_metrics
+        ADD CONSTRAINT daily_metrics_pkey
+            PRIMARY KEY USING INDEX daily_metrics_new_pkey,
+        ADD CONSTRAINT uq_daily_metrics_asset_date
+            UNIQUE USING INDEX daily_metrics_new_asset_date_key;""",
+    """ALTER INDEX daily_metrics_new_asset_date_idx
+        RENAME TO idx_daily_metrics_asset_date;""",
+)
 
 
 # ---------------------------------------------------------------------------
-# Validation Summary
+# NULL Waterfall Validation Query
 # ---------------------------------------------------------------------------
-def log_validation_summary(conn: psycopg2.extensions.connection) -> None:
-    """Log a summary of NULL counts per asset to verify the NULL waterfall.
-
-    Expected NULL counts per asset (from formula validation document):
-        daily_return_pct: 1
-        daily_range_pct:  0
-        vol_7d:           7
-        vol_30d:          30
-        sma_7:            6
-        sma_30:           29
-        volume_ratio_30d: 30
-    """
-    validation_sql: str = """
+# Checks the per-asset NULL counts of the freshly swapped daily_metrics against
+# the expected waterfall entirely in SQL and returns a single summary row:
+#   total_rows          -- rows in daily_metrics after the refresh
+#   assets_with_metrics -- assets that have at least one metrics row
+#   active_assets       -- assets flagged is_active
+#   anomalies           -- JSON array of [symbol, total, ret, rng, v7, v30,
+#                          s7, s30, vr] for offending assets only ('[]' if OK)
+# Sent as the last statement of the compute pipeline.
+VALIDATION_SQL: str = """
+    WITH null_counts AS (
         SELECT
             a.symbol,
             dm.asset_id,
@@ -308,52 +416,146 @@ def log_validation_summary(conn: psycopg2.extensions.connection) -> None:
         FROM daily_metrics dm
         JOIN assets a ON a.asset_id = dm.asset_id
         GROUP BY a.symbol, dm.asset_id
-        ORDER BY dm.asset_id;
+    )
+    SELECT
+        COALESCE(SUM(total_rows), 0)::bigint            AS total_rows,
+        COUNT(*)                                        AS assets_with_metrics,
+        (SELECT COUNT(*) FROM assets WHERE is_active)   AS active_assets,
+        COALESCE(
+            json_agg(
+                json_build_array(
+                    symbol, total_rows, null_return, null_range, null_vol7,
+                    null_vol30, null_sma7, null_sma30, null_volratio
+                )
+                ORDER BY asset_id
+            ) FILTER (
+                WHERE null_return   <> 1
+                   OR null_range    <> 0
+                   OR null_vol7     <> 7
+                   OR null_vol30    <> 30
+                   OR null_sma7     <> 6
+                   OR null_sma30    <> 29
+                   OR null_volratio <> 30
+            ),
+            '[]'::json
+        )                                               AS anomalies
+    FROM null_counts;
+"""
+
+
+# ---------------------------------------------------------------------------
+# Metrics Computation
+# ---------------------------------------------------------------------------
+def compute_metrics(
+    conn: psycopg.Connection,
+    full_recompute: bool = False,
+) -> tuple[int, tuple[int, int, int, list[list[Any]]]]:
+    """Refresh daily_metrics and validate the NULL waterfall.
+
+    By default only the trailing REFRESH_DAYS of each asset are recomputed
+    and upserted into daily_metrics (INCREMENTAL_METRICS_SQL).  With
+    ``full_recompute=True`` all 7 metrics are recomputed from scratch into
+    an UNLOGGED staging table which is then swapped in for daily_metrics.
+
+    All statements, including the NULL-waterfall validation, are queued in
+    a psycopg ``conn.pipeline()`` block: they are sent in one network burst
+    without waiting for each result, so the pipeline costs one round-trip
+    instead of one per statement.  The validation row is fetched in binary
+    format, so the counts arrive as raw int8 rather than text to parse.
+    Everything runs inside a single transaction: readers see either the old
+    or the new metrics and a failure leaves daily_metrics untouched.
+    ``synchronous_commit`` is switched off for this transaction only: the
+    metrics are fully reproducible from daily_prices, so losing the last
+    commit on a crash is harmless.
+
+    Returns ``(rows_written, summary)`` where ``rows_written`` is the
+    INSERT/upsert row count and ``summary`` is the VALIDATION_SQL row
+    ``(total_rows, assets_with_metrics, active_assets, anomalies)``.
     """
-    with conn.cursor() as cur:
-        cur.execute(validation_sql)
-        rows = cur.fetchall()
+    if full_recompute:
+        before: tuple[str, ...] = STAGE_STATEMENTS
+        metrics_sql: str = FULL_METRICS_SQL
+        after: tuple[str, ...] = SWAP_STATEMENTS
+        logger.info("Pipelining stage + compute + swap + validation (single round-trip)...")
+    else:
+        before = ()
+        metrics_sql = INCREMENTAL_METRICS_SQL
+        after = ()
+        logger.info(
+            "Pipelining incremental upsert (last %d days per asset) + validation "
+            "(single round-trip)...",
+            REFRESH_DAYS,
+        )
+
+    with conn.pipeline():
+        conn.execute("SET LOCAL synchronous_commit = off;")
+        for stmt in before:
+            conn.execute(stmt)
+        metrics_cur = conn.execute(metrics_sql)
+        for stmt in after:
+            conn.execute(stmt)
+        val_cur = conn.cursor(binary=True)
+        val_cur.execute(VALIDATION_SQL)
+        # fetchone() syncs the pipeline, so every result (including the
+        # INSERT row count) is available after it.
+        summary = val_cur.fetchone()
+        rows_written: int = metrics_cur.rowcount
+
+    # Commit the transaction (refresh + validation are atomic).
+    conn.commit()
+    return rows_written, summary
+
+
+# ---------------------------------------------------------------------------
+# Validation Summary
+# ---------------------------------------------------------------------------
+def log_validation_summary(summary: tuple[int, int, int, list[list[Any]]]) -> None:
+    """Log the outcome of the NULL waterfall validation.
+
+    ``summary`` is the VALIDATION_SQL row returned by ``compute_metrics``.
+    The expected counts are checked server-side, so only offending assets
+    are listed here.
+
+    Expected NULL counts per asset (from formula validation document):
+        daily_return_pct: 1
+        daily_range_pct:  0
+        vol_7d:           7
+        vol_30d:          30
+        sma_7:            6
+        sma_30:           29
+        volume_ratio_30d: 30
+    """
+    _total_rows, assets_with_metrics, active_assets, anomalies = summary
 
     logger.info("-" * 72)
     logger.info("NULL Waterfall Validation (expected: ret=1, rng=0, v7=7, v30=30, s7=6, s30=29, vr=30)")
-    logger.info(
-        "%-6s %5s %6s %6s %6s %6s %6s %6s %6s",
-        "Symbol", "Total", "Ret", "Rng", "Vol7", "Vol30", "SMA7", "SMA30", "VolR",
-    )
-    logger.info("-" * 72)
 
     all_ok: bool = True
-    for row in rows:
-        symbol, asset_id, total, n_ret, n_rng, n_v7, n_v30, n_s7, n_s30, n_vr = row
+    if assets_with_metrics != active_assets:
+        logger.warning(
+            "  %d active assets but %d have metrics rows.",
+            active_assets,
+            assets_with_metrics,
+        )
+        all_ok = False
+
+    if anomalies:
+        all_ok = False
         logger.info(
-            "%-6s %5d %6d %6d %6d %6d %6d %6d %6d",
-            symbol, total, n_ret, n_rng, n_v7, n_v30, n_s7, n_s30, n_vr,
+            "%-6s %5s %6s %6s %6s %6s %6s %6s %6s",
+            "Symbol", "Total", "Ret", "Rng", "Vol7", "Vol30", "SMA7", "SMA30", "VolR",
         )
-        # Check against expected values.
-        if n_ret != 1:
-            logger.warning("  %s: Expected 1 NULL for daily_return_pct, got %d", symbol, n_ret)
-            all_ok = False
-        if n_rng != 0:
-            logger.warning("  %s: Expected 0 NULLs for daily_range_pct, got %d", symbol, n_rng)
-            all_ok = False
-        if n_v7 != 7:
-            logger.warning("  %s: Expected 7 NULLs for vol_7d, got %d", symbol, n_v7)
-            all_ok = False
-        if n_v30 != 30:
-            logger.warning("  %s: Expected 30 NULLs for vol_30d, got %d", symbol, n_v30)
-            all_ok = False
-        if n_s7 != 6:
-            logger.warning("  %s: Expected 6 NULLs for sma_7, got %d", symbol, n_s7)
-            all_ok = False
-        if n_s30 != 29:
-            logger.warning("  %s: Expected 29 NULLs for sma_30, got %d", symbol, n_s30)
-            all_ok = False
-        if n_vr != 30:
-            logger.warning("  %s: Expected 30 NULLs for volume_ratio_30d, got %d", symbol, n_vr)
-            all_ok = False
+        logger.info("-" * 72)
+        for symbol, total, n_ret, n_rng, n_v7, n_v30, n_s7, n_s30, n_vr in anomalies:
+            logger.warning(
+                "%-6s %5d %6d %6d %6d %6d %6d %6d %6d",
+                symbol, total, n_ret, n_rng, n_v7, n_v30, n_s7, n_s30, n_vr,
+            )
 
     if all_ok:
-        logger.info("NULL waterfall validation PASSED for all assets.")
+        logger.info(
+            "NULL waterfall validation PASSED for all %d assets.", assets_with_metrics
+        )
     else:
         logger.warning("NULL waterfall validation had WARNINGS -- review output above.")
 
@@ -364,36 +566,69 @@ def log_validation_summary(conn: psycopg2.extensions.connection) -> None:
 def main() -> None:
     """Entry point: connect to DB, compute all metrics, log results."""
 
-    # Load .env if present (no error if missing).
-    load_dotenv()
+    parser = argparse.ArgumentParser(description="Compute daily_metrics from daily_prices.")
+    parser.add_argument(
+        "--full-recompute",
+        action="store_true",
+        help=(
+            "Rebuild daily_metrics from the full price history instead of "
+            "refreshing the last %d days per asset. Use after schema or "
+            "formula changes, or after historical prices were revised."
+            % REFRESH_DAYS
+        ),
+    )
+    args = parser.parse_args()
+    _configure_logging()
+
+    # Load .env if present (no error if missing).  Skipped -- including the
+    # python-dotenv import -- only when the shell already provides every
+    # required connection variable; load_dotenv() never overrides the ones
+    # that are set, so a partial environment is completed from .env.
+    if not all(
+        k in os.environ for k in ("DB_HOST", "DB_NAME", "DB_USER", "DB_PASSWORD")
+    ):
+        from dotenv import load_dotenv
+
+        load_dotenv()
 
     logger.info("=" * 72)
     logger.info("Compute Daily Metrics Pipeline")
     logger.info("=" * 72)
-    logger.info("Strategy: DELETE + INSERT (full recompute) in a single transaction")
-    logger.info("Method  : SQL CTE chain with PostgreSQL window functions")
+    if args.full_recompute:
+        logger.info("Strategy: UNLOGGED staging load + table swap (full recompute) in a single transaction")
+    else:
+        logger.info(
+            "Strategy: incremental upsert of the last %d days per asset "
+            "(--full-recompute to rebuild)",
+            REFRESH_DAYS,
+        )
+    logger.info("Method  : single INSERT ... SELECT with PostgreSQL window functions")
     logger.info(
         "Metrics : daily_return_pct, daily_range_pct, vol_7d, vol_30d, "
         "sma_7, sma_30, volume_ratio_30d"
     )
 
     # Connect to database.
-    conn: Optional[psycopg2.extensions.connection] = None
+    conn: Optional[psycopg.Connection] = None
     try:
         conn = get_db_connection()
 
         # Compute all metrics.
         t_start: float = time.perf_counter()
-        rows_inserted: int = compute_metrics(conn)
+        rows_written, validation_summary = compute_metrics(
+            conn, full_recompute=args.full_recompute
+        )
         t_elapsed: float = time.perf_counter() - t_start
+        total_rows: int = validation_summary[0]
 
         logger.info("-" * 72)
         logger.info("Metrics computation complete.")
-        logger.info("  Rows inserted : %d", rows_inserted)
-        logger.info("  Time elapsed  : %.2f seconds", t_elapsed)
+        logger.info("  Rows written          : %d", rows_written)
+        logger.info("  Rows in daily_metrics : %d", total_rows)
+        logger.info("  Time elapsed          : %.2f seconds", t_elapsed)
 
-        # Run validation summary.
-        log_validation_summary(conn)
+        # Log validation summary (it came back with the compute pipeline).
+        log_validation_summary(validation_summary)
 
         logger.info("=" * 72)
         logger.info("Pipeline finished successfully.")
@@ -15,31 +15,44 @@ Purpose:
     Trade-off: Yahoo Finance does not provide market capitalization data.
     The market_cap_usd column in daily_prices will be NULL.
 
+    The whole load runs as one transaction: the populate_* helpers do not
+    commit, and main() commits once after every asset has been loaded.
+    Prices are fetched from Yahoo before the database connection is opened,
+    so the transaction (and the lock taken when partitions are created)
+    never stays open across the download.
+
 Usage:
     # Configure via .env file or environment variables:
     #   DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
     #   START_DATE (default: 2022-01-01)
     #   END_DATE (default: 2025-10-31)
+    #   YF_CACHE_DIR (default: .yf_cache; empty string disables the cache)
 
     python ingest_yahoo.py
 
 Dependencies:
     psycopg2-binary  -- PostgreSQL adapter
     yfinance         -- Yahoo Finance API wrapper
+    pandas           -- DataFrames returned by yfinance (download cache)
     python-dotenv    -- Environment variable loading from .env files
 """
 
+import csv
+import hashlib
+import io
 import logging
+import math
 import os
 import sys
-from datetime import date, timedelta
-from decimal import Decimal, InvalidOperation
-from typing import Any, Optional
+from datetime import date, datetime, timedelta
+from typing import Any, Iterable, NamedTuple, Optional
 
+import pandas as pd
 import psycopg2
-import psycopg2.extras
+import psycopg2.extensions
 import yfinance as yf
 from dotenv import load_dotenv
+from psycopg2 import sql
 
 # ---------------------------------------------------------------------------
 # Logging Configuration
@@ -69,26 +82,30 @@ ASSETS: list[dict[str, str]] = [
 ]
 
 
+class PriceBar(NamedTuple):
+    """One daily OHLCV bar for one asset (a tuple, not a per-row dict)."""
+
+    date: date
+    open: Optional[float]
+    high: Optional[float]
+    low: Optional[float]
+    close: float
+    volume_usd: Optional[float]
+
+
 # ---------------------------------------------------------------------------
-# Decimal Conversion
+# Float Conversion
 # ---------------------------------------------------------------------------
-def _to_decimal(value: Any) -> Optional[Decimal]:
-    """Convert a numeric value to Decimal via str() intermediate to avoid
-    float-to-Decimal precision artefacts.
-
-    Returns None for NaN/None values (which yfinance can produce for
-    days with missing data).
+def _float_column(values: Any) -> list[Optional[float]]:
+    """Convert a whole DataFrame column to Python floats, NaN/inf -> None.
+
+    yfinance produces NaN for days with missing data.  The floats are kept
+    as-is (no Decimal round-trip): COPY writes them with repr(), the shortest
+    repr that round-trips the float64, and the NUMERIC(20,8) columns parse
+    and round that text server-side -- the same digits the old
+    Decimal(str(value)) path stored.
     """
-    if value is None:
-        return None
-    try:
-        s = str(value)
-        if s in ("nan", "NaN", "inf", "-inf", "None"):
-            return None
-        return Decimal(s)
-    except (InvalidOperation, TypeError, ValueError):
-        logger.warning("Could not convert value to Decimal: %r", value)
-        return None
+    return [v if math.isfinite(v) else None for v in values.tolist()]
 
 
 # ---------------------------------------------------------------------------
@@ -99,6 +116,12 @@ def get_db_connection() -> psycopg2.extensions.connection:
 
     Expected env vars: DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD.
     Raises ``psycopg2.OperationalError`` if the connection cannot be established.
+
+    The session is tuned for the bulk load: TCP keepalives stop an idle
+    link (e.g. while yfinance downloads) from being dropped by a NAT or
+    firewall; ``synchronous_commit=off`` skips waiting for the WAL flush
+    (safe because the whole ingest is an idempotent, re-runnable upsert);
+    ``maintenance_work_mem`` sizes the sort behind CLUSTER.
     """
     conn = psycopg2.connect(
         host=os.environ["DB_HOST"],
@@ -106,6 +129,10 @@ def get_db_connection() -> psycopg2.extensions.connection:
         dbname=os.environ["DB_NAME"],
         user=os.environ["DB_USER"],
         password=os.environ["DB_PASSWORD"],
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        options="-c synchronous_commit=off -c maintenance_work_mem=64MB",
     )
     conn.autocommit = False
     logger.info(
@@ -118,6 +145,43 @@ def get_db_connection() -> psycopg2.extensions.connection:
     return conn
 
 
+# ---------------------------------------------------------------------------
+# COPY Staging
+# ---------------------------------------------------------------------------
+def _copy_to_stage(
+    cur: psycopg2.extensions.cursor,
+    stage: str,
+    source: str,
+    columns: tuple[str, ...],
+    rows: Iterable[tuple[Any, ...]],
+) -> None:
+    """COPY ``rows`` into a fresh temp table shaped like ``source``'s ``columns``.
+
+    The stage table takes the column types of ``source`` but none of its
+    constraints or defaults, so serial keys are assigned only when the
+    caller merges the stage into ``source``.  Rows are written as CSV
+    (csv.writer quotes only when needed; None becomes an unquoted empty
+    field, i.e. NULL).  The stage is dropped on commit, and any stage
+    of the same name left earlier in the transaction is replaced.
+    """
+    cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+    cur.execute(sql.SQL("DROP TABLE IF EXISTS {};").format(sql.Identifier(stage)))
+    cur.execute(
+        sql.SQL(
+            "CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA;"
+        ).format(sql.Identifier(stage), cols, sql.Identifier(source))
+    )
+    buf = io.StringIO()
+    csv.writer(buf, quoting=csv.QUOTE_MINIMAL).writerows(rows)
+    buf.seek(0)
+    cur.copy_expert(
+        sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv);").format(
+            sql.Identifier(stage), cols
+        ),
+        buf,
+    )
+
+
 # ---------------------------------------------------------------------------
 # Populate Assets Dimension
 # ---------------------------------------------------------------------------
@@ -127,29 +191,72 @@ def populate_assets(
 ) -> dict[str, int]:
     """Insert or update asset rows and return a mapping of symbol -> asset_id.
 
-    Uses INSERT ... ON CONFLICT (symbol) DO UPDATE to ensure idempotency.
-    Returns a dict like ``{"BTC": 1, "ETH": 2, ...}``.
+    Rows are COPYed into a temp stage table (the same loader path as
+    daily_prices) and merged with one INSERT ... SELECT ... ON CONFLICT
+    (symbol) DO UPDATE to ensure idempotency.  Returns a dict like ``{"BTC": 1, "ETH": 2, ...}``.
     """
     upsert_sql = """
         INSERT INTO assets (symbol, name, category)
-        VALUES (%s, %s, %s)
+        SELECT symbol, name, category
+        FROM tmp_assets
         ON CONFLICT (symbol) DO UPDATE
             SET name     = EXCLUDED.name,
                 category = EXCLUDED.category
         RETURNING asset_id, symbol;
     """
-    symbol_to_id: dict[str, int] = {}
+    rows = ((asset["symbol"], asset["name"], asset["category"]) for asset in assets)
     with conn.cursor() as cur:
-        for asset in assets:
-            cur.execute(upsert_sql, (asset["symbol"], asset["name"], asset["category"]))
-            row = cur.fetchone()
-            if row:
-                symbol_to_id[row[1]] = row[0]
-    conn.commit()
+        _copy_to_stage(cur, "tmp_assets", "assets", ("symbol", "name", "category"), rows)
+        cur.execute(upsert_sql)
+        symbol_to_id: dict[str, int] = {symbol: asset_id for asset_id, symbol in cur.fetchall()}
     logger.info("Upserted %d assets into assets table.", len(symbol_to_id))
     return symbol_to_id
 
 
+# ---------------------------------------------------------------------------
+# Daily Prices Partitions
+# ---------------------------------------------------------------------------
+def create_price_partitions(
+    conn: psycopg2.extensions.connection,
+    symbol_to_id: dict[str, int],
+) -> None:
+    """Ensure daily_prices has one LIST partition per asset.
+
+    daily_prices is ``PARTITION BY LIST (asset_id)``; each asset gets its own
+    ``daily_prices_<symbol>`` partition so its history is stored (and
+    scanned) separately.  Uses CREATE TABLE IF NOT EXISTS, so re-running is
+    a no-op.  Must run before any prices for a new asset are loaded --
+    otherwise they land in daily_prices_default and the partition cannot be
+    attached.
+
+    Raises RuntimeError if daily_prices is not partitioned -- a database
+    created before partitioning keeps its old table, because
+    01_create_tables.sql only creates what is missing.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass('daily_prices');"
+        )
+        if cur.fetchone() is None:
+            raise RuntimeError(
+                "daily_prices is not a partitioned table. Run "
+                "schema/migrations/001_partition_daily_prices.sql and then "
+                "schema/02_create_indexes.sql before ingesting."
+            )
+        for symbol, asset_id in symbol_to_id.items():
+            cur.execute(
+                sql.SQL(
+                    "CREATE TABLE IF NOT EXISTS {} "
+                    "PARTITION OF daily_prices FOR VALUES IN ({});"
+                ).format(
+                    sql.Identifier(f"daily_prices_{symbol.lower()}"),
+                    sql.Literal(asset_id),
+                )
+            )
+    logger.info("Ensured %d daily_prices partitions.", len(symbol_to_id))
+
+
 # ---------------------------------------------------------------------------
 # Populate Date Dimension
 # ---------------------------------------------------------------------------
@@ -161,43 +268,34 @@ def populate_date_dim(
     """Generate all calendar dates in [start_date, end_date] and insert into date_dim.
 
     Computes year, quarter, month, ISO week number, day_of_week (0=Monday),
-    and is_weekend flag for each date.  Uses INSERT ... ON CONFLICT DO NOTHING
+    and is_weekend flag for each date.  The calendar is generated entirely
+    server-side with ``generate_series`` in a single INSERT ... SELECT, so
+    nothing is built or shipped from Python.  Uses ON CONFLICT DO NOTHING
     so the function is idempotent.
 
     Returns the number of *new* rows inserted.
     """
+    # EXTRACT(week) is the ISO week, matching date.isocalendar(); ISODOW is
+    # 1=Monday..7=Sunday, so subtract 1 for the 0=Monday convention.
     insert_sql = """
         INSERT INTO date_dim (date_id, year, quarter, month, week, day_of_week, is_weekend)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        SELECT
+            d::date,
+            EXTRACT(year    FROM d)::int,
+            EXTRACT(quarter FROM d)::int,
+            EXTRACT(month   FROM d)::int,
+            EXTRACT(week    FROM d)::int,
+            EXTRACT(isodow  FROM d)::int - 1,
+            EXTRACT(isodow  FROM d) >= 6
+        FROM generate_series(%s::date, %s::date, INTERVAL '1 day') AS d
         ON CONFLICT (date_id) DO NOTHING;
     """
-    rows: list[tuple[date, int, int, int, int, int, bool]] = []
-    current = start_date
-    while current <= end_date:
-        iso_year, iso_week, iso_weekday = current.isocalendar()
-        day_of_week = current.weekday()  # 0=Monday, 6=Sunday
-        quarter = (current.month - 1) // 3 + 1
-        is_weekend = day_of_week >= 5  # Saturday=5, Sunday=6
-        rows.append((
-            current,
-            current.year,
-            quarter,
-            current.month,
-            iso_week,
-            day_of_week,
-            is_weekend,
-        ))
-        current += timedelta(days=1)
-
-    inserted = 0
     with conn.cursor() as cur:
-        for row in rows:
-            cur.execute(insert_sql, row)
-            inserted += cur.rowcount
-    conn.commit()
+        cur.execute(insert_sql, (start_date, end_date))
+        inserted: int = cur.rowcount
     logger.info(
         "Date dimension: %d total dates in range, %d newly inserted.",
-        len(rows),
+        (end_date - start_date).days + 1,
         inserted,
     )
     return inserted
@@ -206,77 +304,160 @@ def populate_date_dim(
 # ---------------------------------------------------------------------------
 # Yahoo Finance Data Fetching
 # ---------------------------------------------------------------------------
+# Age after which a cached download is refetched.  Bars before yesterday do
+# not change, but the most recent bar can until the UTC day closes.
+YF_CACHE_TTL: timedelta = timedelta(hours=12)
+
+
+def _download_cached(
+    yahoo_tickers: list[str],
+    start_date: date,
+    yf_end: date,
+    cache_dir: Optional[str],
+) -> pd.DataFrame:
+    """Run ``yf.download`` for all tickers, through an on-disk pickle cache.
+
+    The cache file is keyed on the ticker list and date range, so changing
+    either misses the cache.  Files older than YF_CACHE_TTL are ignored and
+    overwritten.  A cache file that cannot be read is deleted and the data
+    downloaded again.  Only complete downloads are cached (see
+    _download_complete), so a partial failure is retried on the next run.
+    ``cache_dir=None`` (or empty) always downloads.
+    """
+    cache_path: Optional[str] = None
+    if cache_dir:
+        key = hashlib.sha1(
+            f"{','.join(yahoo_tickers)}|{start_date.isoformat()}|{yf_end.isoformat()}".encode()
+        ).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, f"yf_{key}.pkl")
+        if os.path.exists(cache_path):
+            age = datetime.now() - datetime.fromtimestamp(os.path.getmtime(cache_path))
+            if age < YF_CACHE_TTL:
+                try:
+                    df = pd.read_pickle(cache_path)
+                except Exception as exc:
+                    logger.warning(
+                        "  Discarding unreadable cache %s: %s", cache_path, exc
+                    )
+                    os.remove(cache_path)
+                else:
+                    logger.info("  Using cached download %s (age %s).", cache_path, age)
+                    return df
+
+    df = yf.download(
+        " ".join(yahoo_tickers),
+        start=start_date.isoformat(),
+        end=yf_end.isoformat(),
+        interval="1d",
+        auto_adjust=True,
+        group_by="ticker",
+        threads=True,
+        progress=False,
+    )
+    if cache_path is not None and _download_complete(df, yahoo_tickers):
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_pickle(cache_path)
+    return df
+
+
+def _download_complete(df: Optional[pd.DataFrame], yahoo_tickers: list[str]) -> bool:
+    """Return True if ``df`` holds some Close data for every ticker.
+
+    yfinance reports per-ticker failures by leaving that ticker's columns
+    all NaN (or out of the frame), not by raising, so an empty check alone
+    would cache -- and keep serving for YF_CACHE_TTL -- a download missing
+    whole assets.
+    """
+    if df is None or df.empty:
+        return False
+    downloaded = set(df.columns.get_level_values(0))
+    return all(
+        t in downloaded and not df[t]["Close"].isna().all() for t in yahoo_tickers
+    )
+
+
 def fetch_yahoo_data(
-    yahoo_ticker: str,
+    yahoo_tickers: list[str],
     start_date: date,
     end_date: date,
-) -> list[dict[str, Any]]:
-    """Fetch daily OHLCV data from Yahoo Finance for a single crypto asset.
+    cache_dir: Optional[str] = None,
+) -> dict[str, list[PriceBar]]:
+    """Fetch daily OHLCV data from Yahoo Finance for all crypto assets at once.
 
-    Uses the ``yfinance`` library which wraps Yahoo Finance's public API.
+    Uses ``yfinance.download`` which wraps Yahoo Finance's public API and
+    accepts many symbols per request, so all assets come back from a single
+    call (yfinance's own worker threads fetch the symbols concurrently).
     Returns daily granularity with full Open/High/Low/Close/Volume data.
 
     No API key is required. No rate limiting is needed for the number of
-    assets in this project (8 assets = 8 calls).
+    assets in this project (8 assets, one download).
 
     Yahoo Finance's end date is exclusive, so we add 1 day to include the
     end_date in results.
 
-    Returns a list of dicts with keys:
-        date, open, high, low, close, volume_usd
-    All monetary values are Decimal. volume_usd is the USD-equivalent
-    volume reported by Yahoo Finance for crypto pairs.
+    If ``cache_dir`` is set, the raw download is cached there (see
+    _download_cached) so re-runs within YF_CACHE_TTL skip Yahoo entirely.
+
+    Returns a dict mapping each ticker to a list of PriceBar tuples:
+        (date, open, high, low, close, volume_usd)
+    All monetary values are float (stored as NUMERIC). volume_usd is the USD-equivalent
+    volume reported by Yahoo Finance for crypto pairs.  A ticker that
+    failed or returned nothing maps to an empty list.
     """
     # yfinance end date is exclusive — add 1 day to include end_date.
     yf_end = end_date + timedelta(days=1)
 
     logger.info(
-        "  Downloading %s from Yahoo Finance (%s to %s)...",
-        yahoo_ticker,
+        "  Downloading %d tickers from Yahoo Finance (%s to %s)...",
+        len(yahoo_tickers),
         start_date.isoformat(),
         end_date.isoformat(),
     )
 
     try:
-        ticker = yf.Ticker(yahoo_ticker)
-        df = ticker.history(
-            start=start_date.isoformat(),
-            end=yf_end.isoformat(),
-            interval="1d",
-            auto_adjust=True,
-        )
+        df = _download_cached(yahoo_tickers, start_date, yf_end, cache_dir)
     except Exception as exc:
-        logger.error("  Failed to download %s: %s", yahoo_ticker, exc)
-        return []
+        logger.error("  Failed to download %s: %s", ", ".join(yahoo_tickers), exc)
+        return {t: [] for t in yahoo_tickers}
 
     if df is None or df.empty:
-        logger.warning("  %s: No data returned from Yahoo Finance.", yahoo_ticker)
-        return []
-
-    records: list[dict[str, Any]] = []
-    for idx, row in df.iterrows():
-        # idx is a pandas Timestamp — convert to date.
-        row_date = idx.date() if hasattr(idx, "date") else idx
-
-        open_val = _to_decimal(row.get("Open"))
-        high_val = _to_decimal(row.get("High"))
-        low_val = _to_decimal(row.get("Low"))
-        close_val = _to_decimal(row.get("Close"))
-        volume_val = _to_decimal(row.get("Volume"))
-
-        # Skip rows where close is missing or zero (invalid data).
-        if close_val is None or close_val <= 0:
-            logger.debug("  Skipping %s %s: invalid close=%s", yahoo_ticker, row_date, close_val)
+        logger.warning("  No data returned from Yahoo Finance.")
+        return {t: [] for t in yahoo_tickers}
+
+    results: dict[str, list[PriceBar]] = {}
+    for yahoo_ticker in yahoo_tickers:
+        if yahoo_ticker not in df.columns.get_level_values(0):
+            logger.warning("  %s: No data returned from Yahoo Finance.", yahoo_ticker)
+            results[yahoo_ticker] = []
             continue
+        results[yahoo_ticker] = _frame_to_records(df[yahoo_ticker], yahoo_ticker)
+    return results
+
 
-        records.append({
-            "date": row_date,
-            "open": open_val,
-            "high": high_val,
-            "low": low_val,
-            "close": close_val,
-            "volume_usd": volume_val,
-        })
+def _frame_to_records(df: Any, yahoo_ticker: str) -> list[PriceBar]:
+    """Convert one ticker's OHLCV DataFrame slice into PriceBar records.
+
+    The multi-ticker download aligns every ticker on the union of dates, so
+    days before a ticker's listing come back as NaN and are dropped along
+    with any other row whose close is missing or zero.  Filtering and
+    conversion run column-wise rather than row by row.
+    """
+    n_raw = len(df)
+    # Skip rows where close is missing, zero or infinite (invalid data);
+    # NaN compares False, so it is dropped too.
+    df = df[(df["Close"] > 0) & (df["Close"] < float("inf"))]
+    if len(df) < n_raw:
+        logger.debug("  Skipping %d %s rows with invalid close.", n_raw - len(df), yahoo_ticker)
+
+    records: list[PriceBar] = list(map(
+        PriceBar,
+        df.index.date,
+        _float_column(df["Open"]),
+        _float_column(df["High"]),
+        _float_column(df["Low"]),
+        _float_column(df["Close"]),
+        _float_column(df["Volume"]),
+    ))
 
     logger.info("  %s: %d daily OHLCV records fetched.", yahoo_ticker, len(records))
     return records
@@ -285,15 +466,22 @@ def fetch_yahoo_data(
 # ---------------------------------------------------------------------------
 # Populate Daily Prices Fact Table
 # ---------------------------------------------------------------------------
+_PRICE_COLUMNS: tuple[str, ...] = (
+    "asset_id", "date", "open", "high", "low", "close", "volume_usd", "market_cap_usd",
+)
+
+
 def populate_daily_prices(
     conn: psycopg2.extensions.connection,
     asset_id: int,
-    daily_data: list[dict[str, Any]],
+    daily_data: list[PriceBar],
 ) -> int:
     """Insert or update daily price records for a single asset.
 
-    Uses INSERT ... ON CONFLICT (asset_id, date) DO UPDATE to achieve
-    idempotent upserts.  All numeric columns are stored as Decimal.
+    Rows are streamed with COPY into a temp stage table (_copy_to_stage)
+    and merged with a single INSERT ... SELECT ... ON CONFLICT
+    (asset_id, date) DO UPDATE, so the load stays an idempotent upsert.
+    All numeric columns are stored as NUMERIC.
 
     Yahoo Finance provides full OHLCV data. market_cap_usd is set to NULL
     as Yahoo Finance does not provide market capitalization.
@@ -303,7 +491,8 @@ def populate_daily_prices(
     upsert_sql = """
         INSERT INTO daily_prices
             (asset_id, date, open, high, low, close, volume_usd, market_cap_usd)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        SELECT asset_id, date, open, high, low, close, volume_usd, market_cap_usd
+        FROM tmp_daily_prices
         ON CONFLICT (asset_id, date) DO UPDATE
             SET open           = EXCLUDED.open,
                 high           = EXCLUDED.high,
@@ -312,31 +501,86 @@ def populate_daily_prices(
                 volume_usd     = EXCLUDED.volume_usd,
                 market_cap_usd = EXCLUDED.market_cap_usd;
     """
-    total = 0
+    # Rows are generated straight from the bars as csv.writer consumes them;
+    # floats are written with repr() and parsed into NUMERIC by the server.
+    rows = (
+        (
+            asset_id,
+            bar.date,
+            bar.open,           # float — full OHLC from Yahoo
+            bar.high,
+            bar.low,
+            bar.close,
+            bar.volume_usd,
+            None,               # market_cap_usd (not available from Yahoo)
+        )
+        for bar in daily_data
+    )
     with conn.cursor() as cur:
-        for rec in daily_data:
-            cur.execute(upsert_sql, (
-                asset_id,
-                rec["date"],
-                rec["open"],            # Decimal — full OHLC from Yahoo
-                rec["high"],            # Decimal
-                rec["low"],             # Decimal
-                rec["close"],           # Decimal
-                rec["volume_usd"],      # Decimal
-                None,                   # market_cap_usd (not available from Yahoo)
-            ))
-            total += 1
-
-    conn.commit()
+        _copy_to_stage(cur, "tmp_daily_prices", "daily_prices", _PRICE_COLUMNS, rows)
+        cur.execute(upsert_sql)
+        total = cur.rowcount
+
     logger.info("  asset_id=%d: upserted %d daily_prices rows.", asset_id, total)
     return total
 
 
+# ---------------------------------------------------------------------------
+# Physical Ordering
+# ---------------------------------------------------------------------------
+# Leaf partitions of idx_daily_prices_asset_date, with the partition each one
+# belongs to.  CLUSTER on a partitioned table needs PostgreSQL 15+, so each
+# partition is clustered on its own index instead.
+_PRICE_PARTITION_INDEXES_SQL: str = """
+    SELECT t.relname AS partition_name, c.relname AS index_name
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_index x ON x.indexrelid = c.oid
+    JOIN pg_class t ON t.oid = x.indrelid
+    WHERE i.inhparent = to_regclass('idx_daily_prices_asset_date')
+    ORDER BY t.relname;
+"""
+
+
+def cluster_daily_prices(conn: psycopg2.extensions.connection) -> None:
+    """Rewrite each daily_prices partition in (asset_id, date) order.
+
+    Upserts leave new row versions wherever there is free space, so over
+    time the heap drifts out of date order.  CLUSTER on the covering
+    idx_daily_prices_asset_date keeps the heap in the same order the
+    metrics windows read it (PARTITION BY asset_id ORDER BY date), so the
+    scan feeding WindowAgg touches heap pages sequentially and needs no
+    Sort.  CLUSTER takes an ACCESS EXCLUSIVE lock per partition; it runs
+    once at the end of each ingestion.
+
+    Skipped with a warning if idx_daily_prices_asset_date does not exist
+    yet (schema/02_create_indexes.sql not run).
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('idx_daily_prices_asset_date');")
+        if cur.fetchone()[0] is None:
+            logger.warning(
+                "idx_daily_prices_asset_date not found -- skipping CLUSTER. "
+                "Run schema/02_create_indexes.sql."
+            )
+            return
+        cur.execute(_PRICE_PARTITION_INDEXES_SQL)
+        partitions: list[tuple[str, str]] = cur.fetchall()
+        for partition_name, index_name in partitions:
+            cur.execute(
+                sql.SQL("CLUSTER {} USING {};").format(
+                    sql.Identifier(partition_name),
+                    sql.Identifier(index_name),
+                )
+            )
+    logger.info("Clustered %d daily_prices partitions on (asset_id, date).", len(partitions))
+
+
 # ---------------------------------------------------------------------------
 # Gap Detection
 # ---------------------------------------------------------------------------
 def _detect_gaps(
-    daily_data: list[dict[str, Any]],
+    daily_data: list[PriceBar],
     start_date: date,
     end_date: date,
     symbol: str,
@@ -350,15 +594,28 @@ def _detect_gaps(
         logger.warning("  %s: No data at all in range %s to %s.", symbol, start_date, end_date)
         return
 
-    actual_dates = {rec["date"] for rec in daily_data}
-    expected: set[date] = set()
-    current = max(start_date, daily_data[0]["date"])
-    last = min(end_date, daily_data[-1]["date"])
-    while current <= last:
-        expected.add(current)
-        current += timedelta(days=1)
-
-    missing = sorted(expected - actual_dates)
+    # daily_data is date-ordered (yfinance returns an ascending index), so
+    # walk it in lockstep with the expected calendar: every expected day
+    # that is passed over before the next actual bar is a gap, as is every
+    # day up to ``last`` still unmatched when a bar past it (after end_date)
+    # ends the walk.
+    first = max(start_date, daily_data[0].date)
+    last = min(end_date, daily_data[-1].date)
+    one_day = timedelta(days=1)
+    missing: list[date] = []
+    expected = first
+    for bar in daily_data:
+        if bar.date < expected:
+            continue            # before the range, or a duplicate date
+        if bar.date > last:
+            break
+        while expected < bar.date:
+            missing.append(expected)
+            expected += one_day
+        expected += one_day
+    while expected <= last:
+        missing.append(expected)
+        expected += one_day
     if missing:
         logger.warning(
             "  %s: %d gap(s) detected in date range. First 10: %s",
@@ -374,7 +631,7 @@ def _detect_gaps(
 # Main Orchestrator
 # ---------------------------------------------------------------------------
 def main() -> None:
-    """Entry point: connect to DB, populate dimensions, fetch and load prices."""
+    """Entry point: fetch prices, then populate dimensions and load them."""
 
     # Load .env if present (no error if missing).
     load_dotenv()
@@ -384,6 +641,7 @@ def main() -> None:
     end_str = os.environ.get("END_DATE", "2025-10-31")
     start_date = date.fromisoformat(start_str)
     end_date = date.fromisoformat(end_str)
+    yf_cache_dir = os.environ.get("YF_CACHE_DIR", ".yf_cache")
 
     logger.info("=" * 72)
     logger.info("Yahoo Finance Ingestion Pipeline")
@@ -396,25 +654,42 @@ def main() -> None:
         "None of the 6 core business questions require market cap."
     )
 
+    # 1. Fetch daily prices before connecting: the download can take a
+    # while, and nothing should sit idle in a transaction meanwhile.
+    logger.info("-" * 72)
+    logger.info("Step 1: Fetching daily OHLCV prices...")
+
+    daily_data_by_ticker = fetch_yahoo_data(
+        yahoo_tickers=[a["yahoo_ticker"] for a in ASSETS],
+        start_date=start_date,
+        end_date=end_date,
+        cache_dir=yf_cache_dir,
+    )
+    for asset_cfg in ASSETS:
+        daily_data = daily_data_by_ticker.get(asset_cfg["yahoo_ticker"], [])
+        if daily_data:
+            _detect_gaps(daily_data, start_date, end_date, asset_cfg["symbol"])
+
     # Connect to database.
     conn = get_db_connection()
 
     try:
-        # 1. Populate assets dimension.
+        # 2. Populate assets dimension.
         logger.info("-" * 72)
-        logger.info("Step 1: Populating assets dimension...")
+        logger.info("Step 2: Populating assets dimension...")
         symbol_to_id = populate_assets(conn, ASSETS)
         for sym, aid in sorted(symbol_to_id.items(), key=lambda x: x[1]):
             logger.info("  %s -> asset_id %d", sym, aid)
+        create_price_partitions(conn, symbol_to_id)
 
-        # 2. Populate date dimension.
+        # 3. Populate date dimension.
         logger.info("-" * 72)
-        logger.info("Step 2: Populating date dimension...")
+        logger.info("Step 3: Populating date dimension...")
         populate_date_dim(conn, start_date, end_date)
 
-        # 3. Fetch and load daily prices for each asset.
+        # 4. Load daily prices for each asset.
         logger.info("-" * 72)
-        logger.info("Step 3: Fetching and loading daily OHLCV prices...")
+        logger.info("Step 4: Loading daily OHLCV prices...")
 
         grand_total = 0
         for asset_cfg in ASSETS:
@@ -425,25 +700,26 @@ def main() -> None:
                 logger.error("No asset_id found for %s -- skipping.", symbol)
                 continue
 
-            logger.info("Fetching %s (ticker=%s)...", symbol, yahoo_ticker)
-
-            daily_data = fetch_yahoo_data(
-                yahoo_ticker=yahoo_ticker,
-                start_date=start_date,
-                end_date=end_date,
-            )
+            daily_data = daily_data_by_ticker.get(yahoo_ticker, [])
 
             if not daily_data:
                 logger.warning("  %s: No data returned. Skipping DB insert.", symbol)
                 continue
 
-            # Detect gaps.
-            _detect_gaps(daily_data, start_date, end_date, symbol)
-
             # Insert into daily_prices.
             rows_upserted = populate_daily_prices(conn, asset_id, daily_data)
             grand_total += rows_upserted
 
+        # 5. Restore the physical (asset_id, date) order of daily_prices.
+        logger.info("-" * 72)
+        logger.info("Step 5: Clustering daily_prices...")
+        cluster_daily_prices(conn)
+
+        # Commit once: every step above is an idempotent upsert, so a
+        # failure anywhere rolls back to the previous state and can simply
+        # be re-run.
+        conn.commit()
+
         logger.info("-" * 72)
         logger.info("Ingestion complete. Total rows upserted: %d", grand_total)
 
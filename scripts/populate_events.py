@@ -8,42 +8,75 @@ Purpose:
     market milestones that are used for event-driven analysis in Phase 4.
 
 Strategy:
-    Uses TRUNCATE + INSERT to ensure idempotency. Since market_events has no
-    natural unique constraint (the same date could theoretically have multiple
-    events), a simple upsert is not possible. Instead, every run truncates the
-    table (resetting the SERIAL sequence) and re-inserts all events from
-    scratch. This guarantees a clean, reproducible state on every execution.
+    Events are identified by their natural key (event_date, title), which
+    is UNIQUE in market_events. Every run stages the full list with COPY,
+    upserts it with ON CONFLICT (event_date, title) DO UPDATE (rewriting
+    only rows whose contents changed) and deletes events that were removed
+    from the list, so the table always matches MARKET_EVENTS exactly while
+    unchanged events keep their event_id.
+
+    A SHA-256 of the event payload is stored in populate_state with each
+    load; the run skips the reload only when it matches and the same digest
+    recomputed over the table's current contents matches too.
 
 Usage:
     # Configure via .env file or environment variables:
     #   DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
 
-    python populate_events.py
+    python populate_events.py           # skip if the payload is already loaded
+    python populate_events.py --force   # always re-synchronise
 
 Dependencies:
-    psycopg2-binary  -- PostgreSQL adapter
+    psycopg[binary]  -- PostgreSQL adapter (psycopg 3)
     python-dotenv    -- Environment variable loading from .env files
 """
 
+import argparse
+import hashlib
 import logging
+import logging.handlers
 import os
+import queue
 import sys
-from typing import Optional
+from datetime import date
+from typing import TYPE_CHECKING, Optional
 
-import psycopg2
-from dotenv import load_dotenv
+# psycopg and python-dotenv are imported where they are used (see
+# get_db_connection / main), so importing this module stays cheap.
+if TYPE_CHECKING:
+    import psycopg
 
 # ---------------------------------------------------------------------------
 # Logging Configuration
 # ---------------------------------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[logging.StreamHandler(sys.stdout)],
-)
+# Installed by _configure_logging() from main(), not at import.
 logger = logging.getLogger("populate_events")
 
+
+def _configure_logging() -> logging.handlers.QueueListener:
+    """Route INFO logging through a queue drained by a background thread.
+
+    Records are only enqueued on the calling thread; formatting and the
+    write to stdout happen on the QueueListener's thread, so a slow stdout
+    (e.g. a pipe into a log aggregator) never blocks the database work.
+    The caller must stop() the returned listener to flush it.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.setFormatter(logging.Formatter(
+        fmt="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    ))
+    # The QueueHandler only merges args (and any traceback) into the
+    # message; the full format is applied once, by stdout_handler.
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    listener = logging.handlers.QueueListener(log_queue, stdout_handler)
+    listener.start()
+    return listener
+
+
 # ---------------------------------------------------------------------------
 # Market Events Data (18 events from Phase 1 Domain Validation)
 # ---------------------------------------------------------------------------
@@ -303,24 +336,75 @@ MARKET_EVENTS: list[dict[str, Optional[str]]] = [
     },
 ]
 
+# market_events load columns, in COPY order.
+EVENT_COLUMNS: tuple[str, ...] = (
+    "event_date", "event_type", "title", "description", "affected_assets", "source_url",
+)
+
+# MARKET_EVENTS flattened once at import into column-ordered tuples, so the
+# load passes rows straight to COPY with no per-row dict lookups.  The
+# dicts above stay the readable source of truth.  event_date is parsed to a
+# datetime.date here, so a malformed date fails at import instead of
+# mid-load.
+EventRow = tuple[date, str, str, Optional[str], Optional[str], Optional[str]]
+EVENT_ROWS: tuple[EventRow, ...] = tuple(
+    (date.fromisoformat(event["event_date"]),)
+    + tuple(event[col] for col in EVENT_COLUMNS[1:])
+    for event in MARKET_EVENTS
+)
+
+# Stable fingerprint of EVENT_ROWS, stored in populate_state after a load so
+# an unchanged payload can skip the load entirely.  It is the SHA-256 of a
+# canonical text that MARKET_EVENTS_DIGEST_SQL rebuilds from the table: one
+# line per event ordered by (event_date, title) -- code-point order, i.e.
+# COLLATE "C" -- with the EVENT_COLUMNS values tab-separated and NULL as \N.
+EVENTS_PAYLOAD_HASH: str = hashlib.sha256(
+    "\n".join(
+        "\t".join(
+            [row[0].isoformat()]
+            + ["\\N" if value is None else value for value in row[1:]]
+        )
+        for row in sorted(EVENT_ROWS, key=lambda row: (row[0], row[2]))
+    ).encode("utf-8")
+).hexdigest()
+POPULATE_STATE_KEY: str = "events"
+
+# Server-side counterpart of EVENTS_PAYLOAD_HASH over market_events' current
+# contents, so edits made outside this script are detected.
+MARKET_EVENTS_DIGEST_SQL: str = r"""
+    SELECT encode(sha256(convert_to(coalesce(string_agg(
+               concat_ws(E'\t',
+                   to_char(event_date, 'YYYY-MM-DD'),
+                   event_type,
+                   title,
+                   coalesce(description, '\N'),
+                   coalesce(affected_assets, '\N'),
+                   coalesce(source_url, '\N')),
+               E'\n' ORDER BY event_date, title COLLATE "C"), ''),
+           'UTF8')), 'hex')
+    FROM market_events;
+"""
+
 
 # ---------------------------------------------------------------------------
 # Database Connection
 # ---------------------------------------------------------------------------
-def get_db_connection() -> psycopg2.extensions.connection:
+def get_db_connection() -> "psycopg.Connection":
     """Create and return a PostgreSQL connection using environment variables.
 
     Expected env vars: DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD.
-    Raises ``psycopg2.OperationalError`` if the connection cannot be established.
+    Raises ``psycopg.OperationalError`` if the connection cannot be established.
     """
-    conn = psycopg2.connect(
+    import psycopg
+
+    conn = psycopg.connect(
         host=os.environ["DB_HOST"],
         port=int(os.environ.get("DB_PORT", "5432")),
         dbname=os.environ["DB_NAME"],
         user=os.environ["DB_USER"],
         password=os.environ["DB_PASSWORD"],
+        autocommit=False,
     )
-    conn.autocommit = False
     logger.info(
         "Connected to PostgreSQL: %s@%s:%s/%s",
         os.environ["DB_USER"],
@@ -334,80 +418,178 @@ def get_db_connection() -> psycopg2.extensions.connection:
 # ---------------------------------------------------------------------------
 # Populate Market Events
 # ---------------------------------------------------------------------------
+def events_unchanged(conn: "psycopg.Connection", payload_hash: str) -> bool:
+    """Return True if ``payload_hash`` is already loaded and still in place.
+
+    populate_state must record ``payload_hash`` *and* market_events' current
+    contents must hash to it (MARKET_EVENTS_DIGEST_SQL) -- the stored hash
+    alone cannot tell that rows were deleted, added or edited outside this
+    script since the last load.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT payload_hash FROM populate_state WHERE script = %s;",
+            (POPULATE_STATE_KEY,),
+        )
+        row = cur.fetchone()
+        if row is None or row[0] != payload_hash:
+            return False
+        cur.execute(MARKET_EVENTS_DIGEST_SQL)
+        (table_hash,) = cur.fetchone()
+    return table_hash == payload_hash
+
+
 def populate_market_events(
-    conn: psycopg2.extensions.connection,
-    events: list[dict[str, Optional[str]]],
-) -> int:
-    """Truncate the market_events table and insert all events.
-
-    Uses TRUNCATE + INSERT for idempotency. Since market_events has no
-    natural unique constraint (multiple events could share the same date),
-    a simple ON CONFLICT upsert is not feasible. TRUNCATE resets the
-    SERIAL sequence and removes all existing rows, then all events are
-    re-inserted cleanly.
-
-    Returns the number of rows inserted.
+    conn: "psycopg.Connection",
+    rows: tuple[EventRow, ...],
+    payload_hash: str,
+) -> tuple[int, int]:
+    """Synchronise the market_events table with ``rows``.
+
+    ``rows`` are event tuples in EVENT_COLUMNS order (normally EVENT_ROWS);
+    ``payload_hash`` is recorded in populate_state with the load.
+
+    Events are keyed by their natural key (event_date, title), enforced by
+    uq_market_events_date_title.  The rows are binary-COPYed into a temp
+    stage table, then upserted with ON CONFLICT (event_date, title) DO UPDATE --
+    skipping rows whose other columns are unchanged -- and any event no
+    longer in the list is deleted.  Unchanged events keep their event_id
+    and generate no writes.
+
+    Returns ``(upserted, deleted)``: rows inserted or changed, and rows
+    removed.
+    """
+    stage_sql = """
+        CREATE TEMP TABLE tmp_market_events ON COMMIT DROP AS
+        SELECT event_date, event_type, title, description, affected_assets, source_url
+        FROM market_events
+        WITH NO DATA;
+    """
+    copy_sql = """
+        COPY tmp_market_events
+            (event_date, event_type, title, description, affected_assets, source_url)
+        FROM STDIN WITH (FORMAT binary);
     """
-    truncate_sql = "TRUNCATE TABLE market_events RESTART IDENTITY;"
-    insert_sql = """
+    upsert_sql = """
         INSERT INTO market_events
             (event_date, event_type, title, description, affected_assets, source_url)
-        VALUES
-            (%s, %s, %s, %s, %s, %s);
+        SELECT event_date, event_type, title, description, affected_assets, source_url
+        FROM tmp_market_events
+        ON CONFLICT (event_date, title) DO UPDATE
+            SET event_type      = EXCLUDED.event_type,
+                description     = EXCLUDED.description,
+                affected_assets = EXCLUDED.affected_assets,
+                source_url      = EXCLUDED.source_url
+            WHERE (market_events.event_type, market_events.description,
+                   market_events.affected_assets, market_events.source_url)
+                  IS DISTINCT FROM
+                  (EXCLUDED.event_type, EXCLUDED.description,
+                   EXCLUDED.affected_assets, EXCLUDED.source_url);
+    """
+    delete_sql = """
+        DELETE FROM market_events me
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM tmp_market_events s
+            WHERE s.event_date = me.event_date
+              AND s.title      = me.title
+        );
+    """
+    record_state_sql = """
+        INSERT INTO populate_state (script, payload_hash)
+        VALUES (%s, %s)
+        ON CONFLICT (script) DO UPDATE
+            SET payload_hash = EXCLUDED.payload_hash,
+                loaded_at    = now();
     """
 
     with conn.cursor() as cur:
-        # Truncate existing events and reset serial counter.
-        cur.execute(truncate_sql)
-        logger.info(
-            "Truncated market_events table (RESTART IDENTITY). "
-            "All previous rows removed."
-        )
+        # Don't wait for the WAL flush at commit: the list is source-controlled
+        # and a re-run reproduces the exact same state.
+        cur.execute("SET LOCAL synchronous_commit = off;")
+
+        # Stage all events with one binary COPY: rows go out as typed
+        # binary values, with no CSV quoting and no server-side text parsing.
+        cur.execute(stage_sql)
+        with cur.copy(copy_sql) as copy:
+            copy.set_types(["date", "varchar", "varchar", "text", "varchar", "text"])
+            for row in rows:
+                copy.write_row(row)
 
-        # Insert all events.
-        inserted = 0
-        for event in events:
-            cur.execute(insert_sql, (
-                event["event_date"],
-                event["event_type"],
-                event["title"],
-                event["description"],
-                event["affected_assets"],
-                event["source_url"],
-            ))
-            inserted += 1
+        cur.execute(upsert_sql)
+        upserted: int = cur.rowcount
+        cur.execute(delete_sql)
+        deleted: int = cur.rowcount
+
+        # Record what was loaded, in the same transaction as the load.
+        cur.execute(record_state_sql, (POPULATE_STATE_KEY, payload_hash))
 
     conn.commit()
-    return inserted
+    return upserted, deleted
 
 
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 def main() -> None:
-    """Entry point: connect to DB, truncate market_events, insert all events."""
+    """Entry point: connect to DB, synchronise market_events with MARKET_EVENTS."""
+
+    parser = argparse.ArgumentParser(description="Load the curated market_events list.")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-synchronise market_events even if populate_state shows the same payload.",
+    )
+    args = parser.parse_args()
+
+    listener = _configure_logging()
+    try:
+        _run(args)
+    finally:
+        # Flush queued records to stdout before exiting.
+        listener.stop()
+
+
+def _run(args: argparse.Namespace) -> None:
+    """Load .env, connect and synchronise market_events (logging is set up)."""
+
+    # Load .env if present (no error if missing).  It never overrides
+    # variables already set in the environment.
+    from dotenv import load_dotenv
 
-    # Load .env if present (no error if missing).
     load_dotenv()
 
     logger.info("=" * 72)
     logger.info("Market Events Population Script")
     logger.info("=" * 72)
     logger.info(
-        "Strategy: TRUNCATE + INSERT (idempotent -- safe to re-run). "
-        "All existing market_events rows will be replaced."
+        "Strategy: COPY to stage + upsert on (event_date, title) "
+        "(idempotent -- safe to re-run). Events not in the list are deleted."
     )
-    logger.info("Events to insert: %d", len(MARKET_EVENTS))
+    logger.info("Events in list: %d", len(EVENT_ROWS))
 
     # Connect to database.
     conn = get_db_connection()
 
     try:
-        inserted = populate_market_events(conn, MARKET_EVENTS)
+        if not args.force and events_unchanged(conn, EVENTS_PAYLOAD_HASH):
+            conn.rollback()
+            logger.info("-" * 72)
+            logger.info(
+                "market_events already holds this payload (sha256 %s...) -- "
+                "nothing to do. Use --force to reload.",
+                EVENTS_PAYLOAD_HASH[:12],
+            )
+            return
+
+        upserted, deleted = populate_market_events(conn, EVENT_ROWS, EVENTS_PAYLOAD_HASH)
         logger.info("-" * 72)
         logger.info(
-            "Done. Successfully inserted %d market events into market_events table.",
-            inserted,
+            "Done. market_events synchronised: %d events inserted or updated, "
+            "%d removed, %d unchanged.",
+            upserted,
+            deleted,
+            len(EVENT_ROWS) - upserted,
         )
     except Exception:
         logger.exception("Fatal error during market events population.")